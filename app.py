@@ -1,7 +1,13 @@
 
 
 from __future__ import annotations
+import hashlib
+import logging
 import os
+import posixpath
+import re
+import sqlite3
+from functools import lru_cache
 from decimal import Decimal
 from typing import Optional
 
@@ -10,24 +16,81 @@ from flask import (
     request,
     redirect,
     url_for,
-    render_template_string,
+    abort,
+    render_template,
+    stream_template,
     flash,
+    session as http_session,
 )
-from sqlalchemy import create_engine, Column, Integer, String, Text, Numeric, select
-from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Numeric, select, insert, update, delete, bindparam
+from sqlalchemy.orm import declarative_base, sessionmaker
+from flask_compress import Compress
 from dotenv import load_dotenv
 
 # Load local .env if present (for local dev). In Azure Web App, use App Settings.
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ----------------------
 # Config & DB setup
 # ----------------------
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
+PAGE_SIZE = 50
+# Largest page whose OFFSET still fits in a signed 64-bit SQL integer.
+MAX_PAGE = (2**63 - 1) // PAGE_SIZE - 1
+
+# Prices are non-negative with at most two decimals (matches the form's step=0.01)
+# and at most 8 integer digits, which is what Numeric(10, 2) holds. Anything
+# that fullmatches is a valid Decimal, so no exception handling is needed.
+_PRICE_RE = re.compile(r"(?:\d{1,8}(?:\.\d{1,2})?|\.\d{1,2})")
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True, query_cache_size=1200)
+
+# Production profile for SQLite: WAL so readers don't block the writer,
+# relaxed fsync, a bigger page cache and memory-mapped reads.
+# (page_size, if ever tuned, has to be set before journal_mode=WAL.)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA trusted_schema=OFF",
+)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
-SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True))
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    if engine.dialect.name != "sqlite":
+        return
+    cur = dbapi_conn.cursor()
+    try:
+        for stmt in SQLITE_PRAGMAS:
+            cur.execute(stmt)
+    finally:
+        cur.close()
+
+@event.listens_for(engine, "checkin")
+def _sqlite_optimize(dbapi_conn, _record):
+    # Let SQLite refresh planner statistics when warranted (usually a no-op).
+    # This runs before the connection goes back to the pool, so it must never
+    # raise: PRAGMA optimize may need the write lock and hit "database is locked".
+    if engine.dialect.name != "sqlite" or dbapi_conn is None:
+        return
+    try:
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute("PRAGMA optimize")
+        finally:
+            cur.close()
+    except sqlite3.Error:
+        logger.warning("PRAGMA optimize failed on checkin", exc_info=True)
+
+# Plain factory: every view opens and closes its own session, so no
+# thread-local registry (and its per-call ident lookup) is needed, and
+# greenlets under gevent/eventlet workers never end up sharing a session.
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 Base = declarative_base()
 
@@ -44,72 +107,98 @@ class Item(Base):
 # Create tables if they don't exist
 Base.metadata.create_all(engine)
 
+# Warm the SQLite planner statistics at startup instead of waiting for the
+# first checkin-time PRAGMA optimize.
+if engine.dialect.name == "sqlite":
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize=0x10002")
+
+# Read statements built once; per-request values go in as bound parameters so
+# every execution hits SQLAlchemy's compiled cache.
+# The list fetches one row past the page so we know whether an older page exists.
+_STMT_LIST = (
+    select(Item.id, Item.name, Item.description, Item.price)
+    .order_by(Item.id.desc())
+    .limit(PAGE_SIZE + 1)
+    .offset(bindparam("offset"))
+)
+_STMT_GET = select(Item).where(Item.id == bindparam("iid"))
+
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
+# Only a handful of templates: keep every compiled one (no LRU eviction) and
+# strip block-tag whitespace from the output. auto_reload already follows
+# app.debug, so production renders skip the loader's uptodate check.
+# Must be set before app.jinja_env is first touched.
+app.jinja_options = {
+    **app.jinja_options,
+    "cache_size": -1,
+    "trim_blocks": True,
+    "lstrip_blocks": True,
+}
+
+# Autoescaping runs on every rendered cell; make sure MarkupSafe's C escape
+# is in use rather than the pure-Python fallback.
+try:
+    from markupsafe import _speedups  # noqa: F401
+except ImportError:  # pragma: no cover
+    logger.warning("markupsafe C speedups unavailable; HTML escaping will use the slow Python fallback")
 
 # ----------------------
 # Templates (inline)
 # ----------------------
+# Page chrome that is identical on every page. It is rendered once per script
+# root (see _chrome) and spliced into the layout as Markup, so the per-request
+# render only covers the title, flashes and page body.
+chrome_tpls = {
+    "head": """
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <link rel="preconnect" href="https://fonts.googleapis.com">
+  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600&display=swap" rel="stylesheet">
+  <link rel="stylesheet" href="{{ url_for('static', filename='app.css', v=asset_version) }}">
+  <script src="{{ url_for('static', filename='app.js', v=asset_version) }}" defer></script>
+""",
+    "nav": """
+      <div class="actions">
+        <a href="{{ url_for('new_item') }}" class="button">➕ New Item</a>
+        <a href="{{ url_for('index') }}" class="button secondary">⟳ Refresh</a>
+      </div>
+""",
+    "footer": """
+    <footer>
+      Connected to: <span class="muted">{{ db_url_display }}</span>
+    </footer>
+""",
+}
+
 layout_tpl = """
 <!doctype html>
+{% set chrome = site_chrome() %}
 <html lang="en">
 <head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
+  {{ chrome.head }}
   <title>{{ title or 'Items App' }}</title>
-  <link rel="preconnect" href="https://fonts.googleapis.com">
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600&display=swap" rel="stylesheet">
-  <style>
-    :root { --bg: #0f172a; --card:#111827; --muted:#94a3b8; --fg:#e5e7eb; --accent:#22d3ee; --red:#ef4444; }
-    *{ box-sizing:border-box; }
-    body{ margin:0; font-family:Inter, system-ui, -apple-system, Segoe UI, Roboto, sans-serif; background:linear-gradient(120deg,#0b1220,#0f172a); color:var(--fg); }
-    .container{ max-width: 980px; margin: 40px auto; padding: 0 16px; }
-    header{ display:flex; align-items:center; justify-content:space-between; margin-bottom: 18px; }
-    .title{ font-weight:700; letter-spacing:0.3px; }
-    .card{ background: rgba(17,24,39,0.75); backdrop-filter: blur(6px); border:1px solid rgba(255,255,255,0.06); border-radius: 16px; padding: 18px; box-shadow: 0 10px 30px rgba(0,0,0,0.35); }
-    .actions{ display:flex; gap:8px; flex-wrap: wrap; }
-    a.button, button.button{ appearance:none; border:none; background:#0ea5e9; color:white; padding:8px 12px; border-radius: 10px; text-decoration:none; font-weight:600; cursor:pointer; }
-    a.button.secondary, button.secondary{ background:#334155; color:#e5e7eb; }
-    a.button.danger, button.danger{ background: var(--red); }
-    table{ width:100%; border-collapse: collapse; margin-top: 10px; }
-    th, td{ text-align:left; padding: 10px 8px; border-bottom:1px solid rgba(255,255,255,0.06); }
-    th{ font-size: 13px; color: var(--muted); text-transform: uppercase; letter-spacing: .08em; }
-    tbody tr:hover{ background: rgba(255,255,255,0.03); }
-    .muted{ color: var(--muted); }
-    form.inline{ display:inline; }
-    .input{ width:100%; padding:10px 12px; background:#0b1220; color:var(--fg); border:1px solid rgba(255,255,255,0.12); border-radius:10px; }
-    .grid{ display:grid; grid-template-columns: 1fr 1fr; gap: 12px; }
-    .grid-1{ grid-template-columns: 1fr; }
-    .field label{ display:block; margin-bottom:6px; color: var(--muted); font-size: 14px; }
-    .flash{ background: rgba(34,211,238,0.12); border:1px solid rgba(34,211,238,0.35); padding:10px 12px; border-radius:10px; margin-bottom:12px; }
-    footer{ margin-top: 24px; color: var(--muted); font-size: 13px; text-align:center; }
-  </style>
 </head>
 <body>
   <div class="container">
     <header>
       <h1 class="title">📦 {{ title or 'Items' }}</h1>
-      <div class="actions">
-        <a href="{{ url_for('new_item') }}" class="button">➕ New Item</a>
-        <a href="{{ url_for('index') }}" class="button secondary">⟳ Refresh</a>
-      </div>
+      {{ chrome.nav }}
     </header>
 
-    {% with messages = get_flashed_messages() %}
-      {% if messages %}
-        {% for msg in messages %}
-          <div class="flash">{{ msg }}</div>
-        {% endfor %}
-      {% endif %}
-    {% endwith %}
+    {% if flashes %}
+      {% for _category, msg in flashes %}
+        <div class="flash">{{ msg }}</div>
+      {% endfor %}
+    {% endif %}
 
     <div class="card">
       {% block content %}{% endblock %}
     </div>
 
-    <footer>
-      Connected to: <span class="muted">{{ db_url_display }}</span>
-    </footer>
+    {{ chrome.footer }}
   </div>
 </body>
 </html>
@@ -118,7 +207,7 @@ layout_tpl = """
 index_tpl = """
 {% extends 'layout' %}
 {% block content %}
-  {% if items %}
+  {% if rows %}
     <table>
       <thead>
         <tr>
@@ -130,15 +219,15 @@ index_tpl = """
         </tr>
       </thead>
       <tbody>
-        {% for i in items %}
+        {% for id, name, desc, price in rows %}
           <tr>
-            <td>{{ i.id }}</td>
-            <td>{{ i.name }}</td>
-            <td class="muted">{{ i.description or '' }}</td>
-            <td>{{ '%.2f'|format(i.price) if i.price is not none else '' }}</td>
+            <td>{{ id }}</td>
+            <td>{{ name }}</td>
+            <td class="muted">{{ desc|default('', true) }}</td>
+            <td>{{ price }}</td>
             <td>
-              <a class="button secondary" href="{{ url_for('edit_item', item_id=i.id) }}">✏️ Edit</a>
-              <form class="inline" method="post" action="{{ url_for('delete_item', item_id=i.id) }}" onsubmit="return confirm('Delete this item?');">
+              <a class="button secondary" href="{{ url_for('edit_item', item_id=id) }}">✏️ Edit</a>
+              <form class="inline" method="post" action="{{ url_for('delete_item', item_id=id) }}" data-confirm="Delete this item?">
                 <button class="button danger" type="submit">🗑️ Delete</button>
               </form>
             </td>
@@ -146,9 +235,17 @@ index_tpl = """
         {% endfor %}
       </tbody>
     </table>
+  {% elif page %}
+    <p class="muted">No items on this page.</p>
   {% else %}
     <p class="muted">No items yet. Create your first one.</p>
   {% endif %}
+  {% if page or has_next %}
+    <div class="actions" style="margin-top:12px;">
+      {% if page %}<a class="button secondary" href="{{ url_for('index', page=page - 1) }}">← Newer</a>{% endif %}
+      {% if has_next %}<a class="button secondary" href="{{ url_for('index', page=page + 1) }}">Older →</a>{% endif %}
+    </div>
+  {% endif %}
 {% endblock %}
 """
 
@@ -180,12 +277,58 @@ form_tpl = """
 
 # Register template strings
 # We use Flask's template loader by overriding jinja loader with a dict-like loader.
-from jinja2 import DictLoader
-app.jinja_loader = DictLoader({
+import click
+import jinja2
+from jinja2 import DictLoader, ModuleLoader
+from markupsafe import Markup
+template_sources = {
     'layout': layout_tpl,
     'index.html': index_tpl,
     'form.html': form_tpl,
-})
+}
+
+def _templates_digest() -> str:
+    # Compiled modules call into Jinja's runtime, so the installed version is
+    # part of the key as well: a redeploy that upgrades Jinja2 recompiles.
+    h = hashlib.sha1(jinja2.__version__.encode())
+    h.update(repr(sorted(app.jinja_options.items())).encode())
+    for name in sorted(template_sources):
+        h.update(name.encode())
+        h.update(template_sources[name].encode())
+    return h.hexdigest()[:10]
+
+# Ahead-of-time compiled templates (built by `flask --app app compile-templates`)
+# are named after a digest of the sources, Jinja options and Jinja version, so a
+# stale archive is never loaded; edited templates fall back to the DictLoader.
+TEMPLATES_ZIP = os.path.join(app.root_path, f"templates-{_templates_digest()}.zip")
+if os.path.exists(TEMPLATES_ZIP):
+    # Flask's dispatching loader only asks loaders for source, so the compiled
+    # module loader goes straight onto the environment.
+    app.jinja_env.loader = ModuleLoader(TEMPLATES_ZIP)
+else:
+    app.jinja_loader = DictLoader(template_sources)
+
+@app.cli.command("compile-templates")
+def compile_templates():
+    """Precompile the inline templates into TEMPLATES_ZIP."""
+    env = app.jinja_env.overlay(loader=DictLoader(template_sources))
+    env.compile_templates(TEMPLATES_ZIP, zip="deflated", ignore_errors=False)
+    click.echo(f"Compiled templates to {TEMPLATES_ZIP}")
+
+# URLs in the chrome only vary with the mount point, so cache per script root.
+@lru_cache(maxsize=None)
+def _chrome(script_root: str) -> dict[str, Markup]:
+    return {
+        name: Markup(app.jinja_env.from_string(src).render())
+        for name, src in chrome_tpls.items()
+    }
+
+app.jinja_env.globals["site_chrome"] = lambda: _chrome(request.script_root)
+
+# Compile templates once at import; views render these Template objects directly
+# so each request skips the source-hash / loader lookup.
+INDEX_T = app.jinja_env.get_template('index.html')
+FORM_T = app.jinja_env.get_template('form.html')
 
 # Helper to mask credentials in the displayed DB URL
 from urllib.parse import urlparse
@@ -202,9 +345,90 @@ def _display_dsn(dsn: str) -> str:
     except Exception:
         return dsn
 
+# DATABASE_URL is fixed for the process, so mask it once and expose it as a
+# Jinja global rather than recomputing it in a per-request context processor.
+DB_URL_DISPLAY = _display_dsn(DATABASE_URL)
+app.jinja_env.globals["db_url_display"] = DB_URL_DISPLAY
+
+# ----------------------
+# Static assets
+# ----------------------
+STATIC_MAX_AGE = 31536000  # one year; URLs carry a content hash, so safe to mark immutable
+
+def _asset_version() -> str:
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(app.static_folder)):
+        path = os.path.join(app.static_folder, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:10]
+
+ASSET_VERSION = _asset_version()
+app.jinja_env.globals["asset_version"] = ASSET_VERSION
+
+class _StaticAssetCache:
+    """Flask-Compress cache backend that keeps only compressed static assets."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        # Keys are "<algorithm>;<_compress_cache_key()>"; pages get an empty
+        # cache key and must never be stored.
+        if not key.endswith(";"):
+            self.data[key] = value
+
+def _compress_cache_key(req) -> str:
+    # Key on the canonical file name (the one safe_join actually served) plus
+    # the content hash, never on the raw path or query string, so the cache is
+    # bounded by the files under static/ no matter how the URL is spelled.
+    if req.endpoint == "static":
+        return f"{posixpath.normpath(req.view_args['filename'])}?v={ASSET_VERSION}"
+    return ""
+
+# Compress text responses (streamed pages included) for clients that accept it.
+# Flask serves .js as text/javascript; application/javascript is kept for
+# anything that sets it explicitly. gzip is appended to the streaming
+# algorithms so gzip-only clients also get a compressed index page.
+app.config.update(
+    COMPRESS_MIMETYPES=["text/html", "text/css", "text/javascript", "application/javascript"],
+    COMPRESS_LEVEL=5,
+    COMPRESS_MIN_SIZE=500,
+    COMPRESS_ALGORITHM_STREAMING=["zstd", "br", "deflate", "gzip"],
+    COMPRESS_CACHE_BACKEND=_StaticAssetCache,
+    COMPRESS_CACHE_KEY=_compress_cache_key,
+)
+# Registered before cache_static below, so its after_request hook runs after it.
+Compress(app)
+
 @app.context_processor
-def inject_globals():
-    return {"db_url_display": _display_dsn(DATABASE_URL)}
+def inject_flashes():
+    # Read flashes straight from the session; most requests have none, so this
+    # skips get_flashed_messages() and leaves the session untouched. Context
+    # processors run before a streamed body starts, so the pop is saved with
+    # the response headers.
+    return {"flashes": http_session.pop("_flashes", None) or ()}
+
+@app.after_request
+def cache_static(response):
+    # Only cache real hits; a 404 must not be pinned for a year.
+    if request.endpoint == "static" and response.status_code in (200, 304):
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        if response.status_code == 200:
+            # Buffer the (small) file so Flask-Compress takes its non-streaming
+            # path, which compresses each asset once and serves it from cache.
+            # Runs before Compress's hook: after_request runs in reverse order.
+            response.make_sequence()
+    return response
+
+def _txn():
+    # Short-lived session: begin, commit (or rollback on error) and close in one block.
+    return SessionLocal.begin()
 
 # ----------------------
 # Routes
@@ -213,14 +437,23 @@ def inject_globals():
 def index():
     session = SessionLocal()
     try:
-        items = session.execute(select(Item).order_by(Item.id.desc())).scalars().all()
-        return render_template_string(index_tpl, title="Items", items=items)
+        page = max(request.args.get("page", 0, type=int), 0)
+        if page > MAX_PAGE:
+            abort(404)
+        rows = session.execute(_STMT_LIST, {"offset": page * PAGE_SIZE}).all()
+        has_next = len(rows) > PAGE_SIZE
+        # Format prices here in one pass instead of a |format filter call per row.
+        rows = [
+            (i.id, i.name, i.description, f"{i.price:.2f}" if i.price is not None else "")
+            for i in rows[:PAGE_SIZE]
+        ]
+        return stream_template(INDEX_T, title="Items", rows=rows, page=page, has_next=has_next)
     finally:
         session.close()
 
 @app.get("/item/new")
 def new_item():
-    return render_template_string(form_tpl, title="New Item", item=None)
+    return render_template(FORM_T, title="New Item", item=None)
 
 @app.post("/item/new")
 def create_item():
@@ -232,36 +465,27 @@ def create_item():
         flash("Name is required")
         return redirect(url_for("new_item"))
     if price_raw:
-        try:
-            price = Decimal(price_raw)
-        except Exception:  # invalid decimal
-            flash("Price must be a number")
+        if not _PRICE_RE.fullmatch(price_raw):
+            flash("Price must be a number up to 99999999.99 with at most 2 decimals")
             return redirect(url_for("new_item"))
+        price = Decimal(price_raw)
 
-    session = SessionLocal()
     try:
-        item = Item(name=name, description=description, price=price)
-        session.add(item)
-        session.commit()
+        with _txn() as s:
+            s.execute(insert(Item).values(name=name, description=description, price=price))
         flash("Item created")
     except Exception as e:
-        session.rollback()
         flash(f"Error creating item: {e}")
-    finally:
-        session.close()
     return redirect(url_for("index"))
 
 @app.get("/item/<int:item_id>/edit")
 def edit_item(item_id: int):
-    session = SessionLocal()
-    try:
-        item = session.get(Item, item_id)
+    with _txn() as s:
+        item = s.execute(_STMT_GET, {"iid": item_id}).scalar_one_or_none()
         if not item:
             flash("Item not found")
             return redirect(url_for("index"))
-        return render_template_string(form_tpl, title="Edit Item", item=item)
-    finally:
-        session.close()
+        return render_template(FORM_T, title="Edit Item", item=item)
 
 @app.post("/item/<int:item_id>/edit")
 def update_item(item_id: int):
@@ -273,63 +497,49 @@ def update_item(item_id: int):
         flash("Name is required")
         return redirect(url_for("edit_item", item_id=item_id))
     if price_raw:
-        try:
-            price = Decimal(price_raw)
-        except Exception:
-            flash("Price must be a number")
+        if not _PRICE_RE.fullmatch(price_raw):
+            flash("Price must be a number up to 99999999.99 with at most 2 decimals")
             return redirect(url_for("edit_item", item_id=item_id))
+        price = Decimal(price_raw)
 
-    session = SessionLocal()
     try:
-        item = session.get(Item, item_id)
-        if not item:
+        with _txn() as s:
+            res = s.execute(
+                update(Item)
+                .where(Item.id == item_id)
+                .values(name=name, description=description, price=price)
+            )
+        if res.rowcount == 0:
             flash("Item not found")
-            return redirect(url_for("index"))
-        item.name = name
-        item.description = description
-        item.price = price
-        session.commit()
-        flash("Item updated")
+        else:
+            flash("Item updated")
     except Exception as e:
-        session.rollback()
         flash(f"Error updating item: {e}")
-    finally:
-        session.close()
     return redirect(url_for("index"))
 
 @app.post("/item/<int:item_id>/delete")
 def delete_item(item_id: int):
-    session = SessionLocal()
     try:
-        item = session.get(Item, item_id)
-        if not item:
+        with _txn() as s:
+            res = s.execute(delete(Item).where(Item.id == item_id))
+        if res.rowcount == 0:
             flash("Item not found")
-            return redirect(url_for("index"))
-        session.delete(item)
-        session.commit()
-        flash("Item deleted")
+        else:
+            flash("Item deleted")
     except Exception as e:
-        session.rollback()
         flash(f"Error deleting item: {e}")
-    finally:
-        session.close()
     return redirect(url_for("index"))
 
 @app.get("/healthz")
 def healthz():
-    # Lightweight DB check
-    session = SessionLocal()
-    try:
-        session.execute(select(1))
-        return {"status": "ok"}, 200
-    except Exception as e:
-        return {"status": "error", "detail": str(e)}, 500
-    finally:
-        session.close()
-
-@app.teardown_appcontext
-def remove_session(exception=None):  # pragma: no cover
-    SessionLocal.remove()
+    # Liveness only by default; ?deep=1 also round-trips to the DB.
+    if request.args.get("deep") == "1":
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+        except Exception as e:
+            return {"status": "error", "detail": str(e)}, 500
+    return {"status": "ok"}, 200
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "127.0.0.1")
@@ -0,0 +1,7 @@
+// Ask for confirmation before submitting any form marked with data-confirm.
+document.addEventListener('submit', function (e) {
+  var form = e.target;
+  if (form.matches('form[data-confirm]') && !confirm(form.dataset.confirm)) {
+    e.preventDefault();
+  }
+});